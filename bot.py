@@ -11,7 +11,15 @@ from http.server import BaseHTTPRequestHandler, HTTPServer
 
 
 import os
+import re
+import asyncio
+import json
+import time
+import hashlib
 import logging
+import sqlite3
+from collections import OrderedDict, defaultdict, deque
+from functools import lru_cache
 from datetime import datetime
 
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
@@ -23,7 +31,7 @@ from telegram.ext import (
     ContextTypes,
     filters,
 )
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 # ==================== ЛОГИРОВАНИЕ ====================
 logging.basicConfig(
@@ -43,11 +51,13 @@ ADMIN_IDS = [
 
 # ==================== OpenAI ====================
 try:
-    openai_client = OpenAI(api_key=OPENAI_API_KEY)
+    openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    _chat_create = openai_client.chat.completions.create
     logger.info("✅ OpenAI клиент инициализирован")
 except Exception as e:
-    logger.error(f"❌ Ошибка инициализации OpenAI: {e}")
+    logger.error("❌ Ошибка инициализации OpenAI: %s", e)
     openai_client = None
+    _chat_create = None
 
 # ==================== СОСТОЯНИЯ ====================
 (
@@ -65,41 +75,147 @@ except Exception as e:
     ADMIN_REMOVE,
 ) = range(12)
 
+# ==================== КНОПКИ ====================
+_AI_BTN = "🤖 Общаться с AI-помощником"
+_STEPS_BTN = "📋 Заполнить по шагам"
+_ADMIN_BTN = "⚙️ Управление администраторами"
+_ADMIN_ADD_BTN = "➕ Добавить администратора"
+_ADMIN_REMOVE_BTN = "➖ Удалить администратора"
+_ADMIN_LIST_BTN = "📋 Список администраторов"
+_BACK_BTN = "◀️ Вернуться назад"
+_CONFIRM_BTN = "✅ Подтвердить и отправить"
+_CANCEL_BTN = "❌ Отменить"
+
+_KB_MODE_USER = ReplyKeyboardMarkup(
+    [[_AI_BTN], [_STEPS_BTN]], resize_keyboard=True, one_time_keyboard=True
+)
+_KB_MODE_ADMIN = ReplyKeyboardMarkup(
+    [[_AI_BTN], [_STEPS_BTN], [_ADMIN_BTN]],
+    resize_keyboard=True,
+    one_time_keyboard=True,
+)
+_KB_ADMIN_MENU = ReplyKeyboardMarkup(
+    [[_ADMIN_ADD_BTN], [_ADMIN_REMOVE_BTN], [_ADMIN_LIST_BTN], [_BACK_BTN]],
+    resize_keyboard=True,
+    one_time_keyboard=True,
+)
+_KB_PARTICIPANTS = ReplyKeyboardMarkup(
+    [["2 автомобиля", "3 автомобиля"], ["Более 3 автомобилей"]],
+    resize_keyboard=True,
+    one_time_keyboard=True,
+)
+_KB_INJURIES = ReplyKeyboardMarkup(
+    [["Нет пострадавших"], ["Есть пострадавшие"]],
+    resize_keyboard=True,
+    one_time_keyboard=True,
+)
+_KB_CONFIRM = ReplyKeyboardMarkup(
+    [[_CONFIRM_BTN], [_CANCEL_BTN]], resize_keyboard=True, one_time_keyboard=True
+)
+_KB_REMOVE = ReplyKeyboardRemove()
+
 # ==================== АДМИНЫ ====================
 
 
-def load_admins():
-    """Загрузка списка администраторов из файла"""
+_ADMIN_CACHE: list[int] | None = None
+_ADMIN_SET: frozenset[int] = frozenset()
+_ADMIN_VERSION: int | None = None
+_ADMIN_LIST_STR = "Нет администраторов"
+_ADMIN_LIST_MD = "Нет администраторов"
+_admin_db: sqlite3.Connection | None = None
+
+
+def _read_legacy_admins() -> list[int]:
+    """Администраторы из старого admins.txt или из кода"""
     try:
         with open("admins.txt", "r") as f:
-            admins = [int(line.strip()) for line in f if line.strip()]
-            logger.info(f"📋 Загружено {len(admins)} администраторов из файла")
-            return admins
+            return [int(line.strip()) for line in f if line.strip()]
     except FileNotFoundError:
         logger.info("📋 Файл admins.txt не найден, используются администраторы из кода")
         return ADMIN_IDS.copy()
+
+
+def _get_admin_db() -> sqlite3.Connection:
+    """Подключение к admins.db; при первом запуске переносит admins.txt"""
+    global _admin_db
+    if _admin_db is None:
+        conn = sqlite3.connect("admins.db", check_same_thread=False)
+        conn.execute("CREATE TABLE IF NOT EXISTS admins (id INTEGER PRIMARY KEY)")
+        if conn.execute("PRAGMA user_version").fetchone()[0] == 0:
+            admins = _read_legacy_admins()
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO admins (id) VALUES (?)",
+                    ((admin_id,) for admin_id in admins),
+                )
+                conn.execute("PRAGMA user_version = 1")
+            logger.info("📋 Перенесено %s администраторов в admins.db", len(admins))
+        _admin_db = conn
+    return _admin_db
+
+
+def _set_admin_cache(admins: list[int], version: int | None) -> None:
+    """Обновление кеша администраторов в памяти"""
+    global _ADMIN_CACHE, _ADMIN_SET, _ADMIN_VERSION, _ADMIN_LIST_STR, _ADMIN_LIST_MD
+    _ADMIN_CACHE = admins
+    _ADMIN_SET = frozenset(admins)
+    _ADMIN_VERSION = version
+    _ADMIN_LIST_STR = (
+        "\n".join([f"• {admin_id}" for admin_id in admins])
+        if admins
+        else "Нет администраторов"
+    )
+    _ADMIN_LIST_MD = (
+        "\n".join([f"• `{admin_id}`" for admin_id in admins])
+        if admins
+        else "Нет администраторов"
+    )
+
+
+def _refresh_admins() -> None:
+    """Перечитывает admins.db только если база изменилась другим подключением"""
+    try:
+        conn = _get_admin_db()
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if _ADMIN_CACHE is not None and version == _ADMIN_VERSION:
+            return
+        admins = [row[0] for row in conn.execute("SELECT id FROM admins ORDER BY id")]
+        logger.info("📋 Загружено %s администраторов из базы", len(admins))
+        _set_admin_cache(admins, version)
     except Exception as e:
-        logger.error(f"❌ Ошибка загрузки администраторов: {e}")
-        return ADMIN_IDS.copy()
+        logger.error("❌ Ошибка загрузки администраторов: %s", e)
+        _set_admin_cache(ADMIN_IDS.copy(), None)
+
+
+def load_admins():
+    """Загрузка списка администраторов"""
+    _refresh_admins()
+    return _ADMIN_CACHE.copy()
 
 
 def save_admins(admins):
-    """Сохранение списка администраторов в файл"""
+    """Сохранение списка администраторов в базу (одной транзакцией)"""
     try:
-        with open("admins.txt", "w") as f:
-            for admin_id in admins:
-                f.write(f"{admin_id}\n")
-        logger.info(f"💾 Сохранено {len(admins)} администраторов в файл")
+        conn = _get_admin_db()
+        with conn:
+            conn.execute("DELETE FROM admins")
+            conn.executemany(
+                "INSERT OR IGNORE INTO admins (id) VALUES (?)",
+                ((admin_id,) for admin_id in admins),
+            )
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        _set_admin_cache(list(admins), version)
+        logger.info("💾 Сохранено %s администраторов в базу", len(admins))
         return True
     except Exception as e:
-        logger.error(f"❌ Ошибка сохранения администраторов: {e}")
+        logger.error("❌ Ошибка сохранения администраторов: %s", e)
         return False
 
 
 def is_admin(user_id: int) -> bool:
     """Проверка является ли пользователь администратором"""
-    admins = load_admins()
-    return user_id in admins
+    _refresh_admins()
+    return user_id in _ADMIN_SET
 
 
 async def send_to_admins(context: ContextTypes.DEFAULT_TYPE, message: str):
@@ -110,29 +226,117 @@ async def send_to_admins(context: ContextTypes.DEFAULT_TYPE, message: str):
         logger.warning("⚠️ Нет администраторов для отправки заявки!")
         return
 
-    success_count = 0
-    for admin_id in admins:
+    async def _send(admin_id: int) -> int | None:
         try:
             await context.bot.send_message(
                 chat_id=admin_id,
                 text=message,
                 parse_mode="Markdown",
             )
-            success_count += 1
-            logger.info(f"✅ Заявка отправлена администратору {admin_id}")
+            logger.info("✅ Заявка отправлена администратору %s", admin_id)
+            return admin_id
         except Exception as e:
-            logger.error(f"❌ Ошибка отправки администратору {admin_id}: {e}")
+            logger.error("❌ Ошибка отправки администратору %s: %s", admin_id, e)
+            return None
+
+    results = await asyncio.gather(*(_send(admin_id) for admin_id in admins))
+    success_count = sum(1 for result in results if result is not None)
 
     logger.info(
-        f"📨 Заявка отправлена {success_count} из {len(admins)} администраторов"
+        "📨 Заявка отправлена %s из %s администраторов", success_count, len(admins)
     )
 
 
 # ==================== AI ====================
 
+_PHONE_RE = re.compile(
+    r"(?:\+7|8)[\s-]?\d{3}[\s-]?\d{3}[\s-]?\d{2}[\s-]?\d{2}|\d{11}"
+)
+_ADDRESS_RE = re.compile(
+    r"\b(?:улица|ул\.|проспект|пр\.|переулок|пер\.|площадь|шоссе|дом|д\.)",
+    re.IGNORECASE,
+)
+_DAMAGE_RE = re.compile(
+    r"\b(?:бампер|фара|крыло|дверь|капот|повреждени|царапин|вмятин|разбит)",
+    re.IGNORECASE,
+)
+_INJ_NO_RE = re.compile(r"нет пострадавших|никто не пострадал", re.IGNORECASE)
+_INJ_YES_RE = re.compile(r"\b(?:пострадал|ранен)", re.IGNORECASE)
+_PART2_RE = re.compile(r"\bдва\b|\b2\b", re.IGNORECASE)
+_PART3_RE = re.compile(r"\bтри\b|\b3\b", re.IGNORECASE)
+
+_AI_MODEL = "gpt-3.5-turbo"
+_AI_MAX_TOKENS = 300
+_AI_TEMPERATURE = 0
+_AI_CACHE_TTL = 1800
+_AI_CACHE_MAX = 1000
+_AI_CACHE: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+
+def _ai_cache_key(messages: list) -> str:
+    """Ключ кеша ответов AI: хеш модели, сообщений и параметров запроса"""
+    payload = json.dumps(
+        {
+            "model": _AI_MODEL,
+            "messages": messages,
+            "temperature": _AI_TEMPERATURE,
+            "max_tokens": _AI_MAX_TOKENS,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _ai_cache_get(key: str) -> str | None:
+    """Ответ из кеша, если он есть и не устарел"""
+    cached = _AI_CACHE.get(key)
+    if cached is None:
+        return None
+    ai_message, created = cached
+    if time.time() - created > _AI_CACHE_TTL:
+        del _AI_CACHE[key]
+        return None
+    _AI_CACHE.move_to_end(key)
+    return ai_message
 
-def get_ai_response(
-    user_message: str, conversation_history: list, application_data: dict
+
+def _ai_cache_put(key: str, ai_message: str) -> None:
+    """Сохранение ответа в кеш с вытеснением самых старых записей"""
+    _AI_CACHE[key] = (ai_message, time.time())
+    _AI_CACHE.move_to_end(key)
+    while len(_AI_CACHE) > _AI_CACHE_MAX:
+        _AI_CACHE.popitem(last=False)
+
+
+_SYSTEM_STATIC = """Ты - помощник аварийного комиссара. Помогаешь оформить заявку после ДТП.
+
+Твоя задача:
+1. Собрать информацию: место ДТП, участники, повреждения, пострадавшие, контакт
+2. Быть вежливым и кратким
+3. Задавать по одному вопросу за раз
+
+Если поле не заполнено, спроси о нём. Отвечай кратко на русском языке."""
+
+_PROMPT_FIELDS = ("location", "participants", "damage", "injuries", "contact")
+
+
+@lru_cache(maxsize=128)
+def _fmt_prompt(app_tuple: tuple) -> str:
+    """Динамическая часть системного промпта с текущими данными заявки"""
+    location, participants, damage, injuries, contact = (
+        value or "не указано" for value in app_tuple
+    )
+    return f"""Текущие данные заявки:
+- Место: {location}
+- Участники: {participants}
+- Повреждения: {damage}
+- Пострадавшие: {injuries}
+- Контакт: {contact}"""
+
+
+async def get_ai_response(
+    user_message: str, conversation_history: deque, application_data: dict
 ) -> str:
     """Получить ответ от AI-агента OpenAI"""
 
@@ -143,39 +347,38 @@ def get_ai_response(
         )
 
     try:
-        system_prompt = f"""Ты - помощник аварийного комиссара. Помогаешь оформить заявку после ДТП.
-
-Твоя задача:
-1. Собрать информацию: место ДТП, участники, повреждения, пострадавшие, контакт
-2. Быть вежливым и кратким
-3. Задавать по одному вопросу за раз
-
-Текущие данные заявки:
-- Место: {application_data.get('location', 'не указано')}
-- Участники: {application_data.get('participants', 'не указано')}
-- Повреждения: {application_data.get('damage', 'не указано')}
-- Пострадавшие: {application_data.get('injuries', 'не указано')}
-- Контакт: {application_data.get('contact', 'не указано')}
-
-Если поле не заполнено, спроси о нём. Отвечай кратко на русском языке."""
+        messages = [
+            {"role": "system", "content": _SYSTEM_STATIC},
+            {
+                "role": "system",
+                "content": _fmt_prompt(
+                    tuple(application_data.get(field) for field in _PROMPT_FIELDS)
+                ),
+            },
+            *conversation_history,
+            {"role": "user", "content": user_message},
+        ]
 
-        messages = [{"role": "system", "content": system_prompt}]
-        messages.extend(conversation_history[-10:])
-        messages.append({"role": "user", "content": user_message})
+        cache_key = _ai_cache_key(messages)
+        ai_message = _ai_cache_get(cache_key)
+        if ai_message is not None:
+            logger.info("♻️ Ответ AI взят из кеша: %.50s...", ai_message)
+            return ai_message
 
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
+        response = await _chat_create(
+            model=_AI_MODEL,
             messages=messages,
-            max_tokens=300,
-            temperature=0.7,
+            max_tokens=_AI_MAX_TOKENS,
+            temperature=_AI_TEMPERATURE,
         )
 
         ai_message = response.choices[0].message.content
-        logger.info(f"✅ Получен ответ от AI: {ai_message[:50]}...")
+        _ai_cache_put(cache_key, ai_message)
+        logger.info("✅ Получен ответ от AI: %.50s...", ai_message)
         return ai_message
 
     except Exception as e:
-        logger.error(f"❌ Ошибка OpenAI API: {e}")
+        logger.error("❌ Ошибка OpenAI API: %s", e)
         return (
             "Извините, произошла ошибка при обработке сообщения. "
             "Попробуйте ещё раз или используйте режим с кнопками (/start)."
@@ -184,123 +387,143 @@ def get_ai_response(
 
 def extract_info_from_message(message: str, application: dict) -> dict:
     """Извлекает данные из сообщения пользователя"""
-    message_lower = message.lower()
+    if all(
+        application.get(field)
+        for field in ("location", "participants", "damage", "injuries", "contact")
+    ):
+        return {}
+
     updated = {}
 
     # Адрес
     if not application.get("location"):
-        address_keywords = [
-            "улица",
-            "ул.",
-            "проспект",
-            "пр.",
-            "переулок",
-            "пер.",
-            "площадь",
-            "шоссе",
-            "дом",
-            "д.",
-        ]
-        if any(word in message_lower for word in address_keywords):
+        if _ADDRESS_RE.search(message):
             application["location"] = message
             updated["location"] = True
 
     # Участники
     if not application.get("participants"):
-        if "два" in message_lower or "2" in message:
+        if _PART2_RE.search(message):
             application["participants"] = "2 автомобиля"
             updated["participants"] = True
-        elif "три" in message_lower or "3" in message:
+        elif _PART3_RE.search(message):
             application["participants"] = "3 автомобиля"
             updated["participants"] = True
 
     # Повреждения
     if not application.get("damage"):
-        damage_keywords = [
-            "бампер",
-            "фара",
-            "крыло",
-            "дверь",
-            "капот",
-            "повреждение",
-            "царапина",
-            "вмятина",
-            "разбит",
-        ]
-        if any(word in message_lower for word in damage_keywords):
+        if _DAMAGE_RE.search(message):
             application["damage"] = message
             updated["damage"] = True
 
     # Пострадавшие
     if not application.get("injuries"):
-        if (
-            "нет пострадавших" in message_lower
-            or "никто не пострадал" in message_lower
-        ):
+        if _INJ_NO_RE.search(message):
             application["injuries"] = "Нет пострадавших"
             updated["injuries"] = True
-        elif "пострадал" in message_lower or "ранен" in message_lower:
+        elif _INJ_YES_RE.search(message):
             application["injuries"] = "Есть пострадавшие"
             updated["injuries"] = True
 
     # Телефон
     if not application.get("contact"):
-        import re
-
-        phone_patterns = [
-            r"\+7[\s-]?\d{3}[\s-]?\d{3}[\s-]?\d{2}[\s-]?\d{2}",
-            r"8[\s-]?\d{3}[\s-]?\d{3}[\s-]?\d{2}[\s-]?\d{2}",
-            r"\d{11}",
-        ]
-        for pattern in phone_patterns:
-            match = re.search(pattern, message)
-            if match:
-                application["contact"] = match.group()
-                updated["contact"] = True
-                break
+        match = _PHONE_RE.search(message)
+        if match:
+            application["contact"] = match.group()
+            updated["contact"] = True
 
     return updated
 
 
-def format_application(app: dict, user_info: dict | None = None) -> str:
-    """Форматирование заявки для отправки"""
-
-    user_section = ""
-    if user_info:
-        user_section = f"""
+_USER_SECTION_TEMPLATE = """
 👤 *ИНФОРМАЦИЯ О ПОЛЬЗОВАТЕЛЕ:*
-Имя: {user_info.get('first_name', 'Не указано')}
-Username: @{user_info.get('username', 'нет')}
-Telegram ID: `{user_info.get('user_id', 'н/д')}`
+Имя: {first_name}
+Username: @{username}
+Telegram ID: `{user_id}`
 
 """
 
-    return f"""
+_APP_TEMPLATE = """
 🚨 *НОВАЯ ЗАЯВКА НА АВАРИЙНОГО КОМИССАРА*
 ━━━━━━━━━━━━━━━━━━━━━
 {user_section}
 🕐 *Дата и время:*
-{datetime.fromisoformat(app['timestamp']).strftime('%d.%m.%Y %H:%M:%S')}
+{timestamp_human}
 
 📍 *Место ДТП:*
-{app.get('location', 'не указано')}
+{location}
 
 👥 *Участники:*
-{app.get('participants', 'не указано')}
+{participants}
 
 🚗 *Повреждения:*
-{app.get('damage', 'не указано')}
+{damage}
 
 🚑 *Пострадавшие:*
-{app.get('injuries', 'не указано')}
+{injuries}
 
 📞 *Контакт:*
-{app.get('contact', 'не указано')}
+{contact}
 
 ━━━━━━━━━━━━━━━━━━━━━
-⏰ Время получения: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}
+⏰ Время получения: {received_at}
 """
 
+_SUMMARY_TEMPLATE = """
+━━━━━━━━━━━━━━━━━━━━━
+📋 ЗАЯВКА НА АВАРИЙНОГО КОМИССАРА
+━━━━━━━━━━━━━━━━━━━━━
+
+🕐 Время: {timestamp_human}
+
+📍 Место ДТП:
+{location}
+
+👥 Участники:
+{participants}
+
+🚗 Повреждения:
+{damage}
+
+🚑 Пострадавшие:
+{injuries}
+
+📞 Контакт:
+{contact}
+
+━━━━━━━━━━━━━━━━━━━━━
+"""
+
+
+def _template_fields(data: dict, default: str = "не указано") -> defaultdict:
+    """Поля для format_map: незаполненные значения заменяются на default"""
+    return defaultdict(
+        lambda: default, {k: v for k, v in data.items() if v is not None}
+    )
+
+
+def format_application(app: dict, user_info: dict | None = None) -> str:
+    """Форматирование заявки для отправки"""
+    fields = _template_fields(app)
+    fields["user_section"] = ""
+    if user_info:
+        fields["user_section"] = _USER_SECTION_TEMPLATE.format(
+            first_name=user_info.get("first_name") or "Не указано",
+            username=user_info.get("username") or "нет",
+            user_id=user_info.get("user_id") or "н/д",
+        )
+    fields["received_at"] = datetime.now().strftime("%d.%m.%Y %H:%M:%S")
+    return _APP_TEMPLATE.format_map(fields)
+
+
+async def _send_confirm(update: Update, app: dict) -> int:
+    """Отправка сводки заявки пользователю на подтверждение"""
+    summary = _SUMMARY_TEMPLATE.format_map(_template_fields(app))
+    await update.message.reply_text(
+        summary + "\n\nПроверьте данные:", reply_markup=_KB_CONFIRM
+    )
+    return CONFIRM
+
 
 # ==================== ОБРАБОТЧИКИ ====================
 
@@ -308,22 +531,12 @@ Telegram ID: `{user_info.get('user_id', 'н/д')}`
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Начало работы с ботом"""
     user = update.effective_user
-    logger.info(f"👤 Пользователь {user.first_name} ({user.id}) начал работу")
-
-    if is_admin(user.id):
-        keyboard = [
-            ["🤖 Общаться с AI-помощником"],
-            ["📋 Заполнить по шагам"],
-            ["⚙️ Управление администраторами"],
-        ]
-    else:
-        keyboard = [
-            ["🤖 Общаться с AI-помощником"],
-            ["📋 Заполнить по шагам"],
-        ]
+    logger.info("👤 Пользователь %s (%s) начал работу", user.first_name, user.id)
 
+    ts = datetime.now()
     context.user_data["application"] = {
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": ts.isoformat(),
+        "timestamp_human": ts.strftime("%d.%m.%Y %H:%M:%S"),
         "location": None,
         "participants": None,
         "damage": None,
@@ -331,11 +544,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         "photos_count": 0,
         "contact": None,
     }
-    context.user_data["ai_history"] = []
+    context.user_data["ai_history"] = deque(maxlen=10)
 
-    reply_markup = ReplyKeyboardMarkup(
-        keyboard, resize_keyboard=True, one_time_keyboard=True
-    )
+    reply_markup = _KB_MODE_ADMIN if is_admin(user.id) else _KB_MODE_USER
 
     await update.message.reply_text(
         f"Здравствуйте, {user.first_name}! 👋\n\n"
@@ -347,29 +558,45 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return CHOOSING_MODE
 
 
+async def _start_ai_mode(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text(
+        "🤖 Отлично! Теперь общайтесь со мной свободно.\n\n"
+        "Расскажите, что произошло и где?",
+        reply_markup=_KB_REMOVE,
+    )
+    return AI_CHAT
+
+
+async def _start_step_mode(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text(
+        "📋 Буду задавать вопросы по порядку.\n\n"
+        "📍 Шаг 1/5: Где произошло ДТП?\n"
+        "Укажите адрес или ориентиры:",
+        reply_markup=_KB_REMOVE,
+    )
+    return LOCATION
+
+
+async def _open_admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    if not is_admin(update.effective_user.id):
+        return await _start_step_mode(update, context)
+    return await admin_menu(update, context)
+
+
+_MODE_ACTIONS = {
+    _AI_BTN: _start_ai_mode,
+    _STEPS_BTN: _start_step_mode,
+    _ADMIN_BTN: _open_admin_menu,
+}
+
+
 async def choose_mode(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Выбор режима работы"""
     choice = update.message.text
-    logger.info(f"📌 Выбран режим: {choice}")
+    logger.info("📌 Выбран режим: %s", choice)
 
-    if "⚙️" in choice and is_admin(update.effective_user.id):
-        return await admin_menu(update, context)
-
-    if "🤖" in choice or "AI" in choice.upper():
-        await update.message.reply_text(
-            "🤖 Отлично! Теперь общайтесь со мной свободно.\n\n"
-            "Расскажите, что произошло и где?",
-            reply_markup=ReplyKeyboardRemove(),
-        )
-        return AI_CHAT
-    else:
-        await update.message.reply_text(
-            "📋 Буду задавать вопросы по порядку.\n\n"
-            "📍 Шаг 1/5: Где произошло ДТП?\n"
-            "Укажите адрес или ориентиры:",
-            reply_markup=ReplyKeyboardRemove(),
-        )
-        return LOCATION
+    handler = _MODE_ACTIONS.get(choice, _start_step_mode)
+    return await handler(update, context)
 
 
 # ==================== АДМИН-ПАНЕЛЬ ====================
@@ -380,89 +607,78 @@ async def admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     if not is_admin(update.effective_user.id):
         await update.message.reply_text(
             "❌ У вас нет доступа к этой функции.",
-            reply_markup=ReplyKeyboardRemove(),
+            reply_markup=_KB_REMOVE,
         )
         return ConversationHandler.END
 
-    admins = load_admins()
-    admin_list = (
-        "\n".join([f"• {admin_id}" for admin_id in admins])
-        if admins
-        else "Нет администраторов"
-    )
-
-    keyboard = [
-        ["➕ Добавить администратора"],
-        ["➖ Удалить администратора"],
-        ["📋 Список администраторов"],
-        ["◀️ Вернуться назад"],
-    ]
-    reply_markup = ReplyKeyboardMarkup(
-        keyboard, resize_keyboard=True, one_time_keyboard=True
-    )
+    _refresh_admins()
 
     await update.message.reply_text(
         f"⚙️ *УПРАВЛЕНИЕ АДМИНИСТРАТОРАМИ*\n\n"
-        f"Текущие администраторы ({len(admins)}):\n{admin_list}\n\n"
+        f"Текущие администраторы ({len(_ADMIN_CACHE)}):\n{_ADMIN_LIST_STR}\n\n"
         f"Выберите действие:",
-        reply_markup=reply_markup,
+        reply_markup=_KB_ADMIN_MENU,
         parse_mode="Markdown",
     )
 
     return ADMIN_MENU
 
 
-async def admin_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Обработка выбора в админ-меню"""
-    choice = update.message.text
+async def _admin_add_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text(
+        "➕ Отправьте Telegram ID нового администратора:\n\n"
+        "💡 Как узнать ID:\n"
+        "1. Напишите боту @userinfobot\n"
+        "2. Он отправит вам ваш ID\n\n"
+        "Для отмены отправьте /cancel",
+        reply_markup=_KB_REMOVE,
+    )
+    return ADMIN_ADD
+
 
-    if "➕" in choice:
+async def _admin_remove_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    _refresh_admins()
+    if not _ADMIN_CACHE:
         await update.message.reply_text(
-            "➕ Отправьте Telegram ID нового администратора:\n\n"
-            "💡 Как узнать ID:\n"
-            "1. Напишите боту @userinfobot\n"
-            "2. Он отправит вам ваш ID\n\n"
-            "Для отмены отправьте /cancel",
-            reply_markup=ReplyKeyboardRemove(),
+            "❌ Нет администраторов для удаления.",
+            reply_markup=_KB_REMOVE,
         )
-        return ADMIN_ADD
+        return ConversationHandler.END
 
-    elif "➖" in choice:
-        admins = load_admins()
-        if not admins:
-            await update.message.reply_text(
-                "❌ Нет администраторов для удаления.",
-                reply_markup=ReplyKeyboardRemove(),
-            )
-            return ConversationHandler.END
+    await update.message.reply_text(
+        "➖ Отправьте Telegram ID администратора для удаления:\n\n"
+        "Текущие администраторы:\n"
+        + _ADMIN_LIST_STR
+        + "\n\n"
+        "Для отмены отправьте /cancel",
+        reply_markup=_KB_REMOVE,
+    )
+    return ADMIN_REMOVE
 
-        await update.message.reply_text(
-            "➖ Отправьте Telegram ID администратора для удаления:\n\n"
-            "Текущие администраторы:\n"
-            + "\n".join([f"• {aid}" for aid in admins])
-            + "\n\n"
-            "Для отмены отправьте /cancel",
-            reply_markup=ReplyKeyboardRemove(),
-        )
-        return ADMIN_REMOVE
 
-    elif "📋" in choice:
-        admins = load_admins()
-        admin_list = (
-            "\n".join([f"• `{admin_id}`" for admin_id in admins])
-            if admins
-            else "Нет администраторов"
-        )
+async def _admin_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    _refresh_admins()
+
+    await update.message.reply_text(
+        f"📋 *СПИСОК АДМИНИСТРАТОРОВ* ({len(_ADMIN_CACHE)}):\n\n{_ADMIN_LIST_MD}",
+        parse_mode="Markdown",
+        reply_markup=_KB_REMOVE,
+    )
+    return await admin_menu(update, context)
 
-        await update.message.reply_text(
-            f"📋 *СПИСОК АДМИНИСТРАТОРОВ* ({len(admins)}):\n\n{admin_list}",
-            parse_mode="Markdown",
-            reply_markup=ReplyKeyboardRemove(),
-        )
-        return await admin_menu(update, context)
 
-    else:
-        return await start(update, context)
+_ADMIN_ACTIONS = {
+    _ADMIN_ADD_BTN: _admin_add_prompt,
+    _ADMIN_REMOVE_BTN: _admin_remove_prompt,
+    _ADMIN_LIST_BTN: _admin_list,
+    _BACK_BTN: start,
+}
+
+
+async def admin_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Обработка выбора в админ-меню"""
+    handler = _ADMIN_ACTIONS.get(update.message.text, start)
+    return await handler(update, context)
 
 
 async def admin_add_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -481,7 +697,7 @@ async def admin_add_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 await update.message.reply_text(
                     f"✅ Администратор {new_admin_id} успешно добавлен!"
                 )
-                logger.info(f"✅ Добавлен новый администратор: {new_admin_id}")
+                logger.info("✅ Добавлен новый администратор: %s", new_admin_id)
             else:
                 await update.message.reply_text("❌ Ошибка при сохранении администратора.")
 
@@ -515,7 +731,7 @@ async def admin_remove_handler(update: Update, context: ContextTypes.DEFAULT_TYP
                 await update.message.reply_text(
                     f"✅ Администратор {remove_admin_id} успешно удалён!"
                 )
-                logger.info(f"✅ Удалён администратор: {remove_admin_id}")
+                logger.info("✅ Удалён администратор: %s", remove_admin_id)
             else:
                 await update.message.reply_text("❌ Ошибка при сохранении изменений.")
 
@@ -534,113 +750,61 @@ async def admin_remove_handler(update: Update, context: ContextTypes.DEFAULT_TYP
 
 async def get_location(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data["application"]["location"] = update.message.text
-    logger.info(f"📍 Место ДТП: {update.message.text}")
-
-    keyboard = [
-        ["2 автомобиля", "3 автомобиля"],
-        ["Более 3 автомобилей"],
-    ]
-    reply_markup = ReplyKeyboardMarkup(
-        keyboard, resize_keyboard=True, one_time_keyboard=True
-    )
+    logger.info("📍 Место ДТП: %s", update.message.text)
 
     await update.message.reply_text(
         "✅ Место ДТП сохранено.\n\n"
         "👥 Шаг 2/5: Сколько автомобилей участвовало?",
-        reply_markup=reply_markup,
+        reply_markup=_KB_PARTICIPANTS,
     )
     return PARTICIPANTS
 
 
 async def get_participants(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data["application"]["participants"] = update.message.text
-    logger.info(f"👥 Участники: {update.message.text}")
+    logger.info("👥 Участники: %s", update.message.text)
 
     await update.message.reply_text(
         "✅ Количество участников сохранено.\n\n"
         "🚗 Шаг 3/5: Опишите повреждения вашего автомобиля:\n"
         "(например: разбита фара, помят бампер)",
-        reply_markup=ReplyKeyboardRemove(),
+        reply_markup=_KB_REMOVE,
     )
     return DAMAGE
 
 
 async def get_damage(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data["application"]["damage"] = update.message.text
-    logger.info(f"🚗 Повреждения: {update.message.text}")
-
-    keyboard = [
-        ["Нет пострадавших"],
-        ["Есть пострадавшие"],
-    ]
-    reply_markup = ReplyKeyboardMarkup(
-        keyboard, resize_keyboard=True, one_time_keyboard=True
-    )
+    logger.info("🚗 Повреждения: %s", update.message.text)
 
     await update.message.reply_text(
         "✅ Повреждения зафиксированы.\n\n"
         "🚑 Шаг 4/5: Есть ли пострадавшие?",
-        reply_markup=reply_markup,
+        reply_markup=_KB_INJURIES,
     )
     return INJURIES
 
 
 async def get_injuries(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data["application"]["injuries"] = update.message.text
-    logger.info(f"🚑 Пострадавшие: {update.message.text}")
+    logger.info("🚑 Пострадавшие: %s", update.message.text)
 
     await update.message.reply_text(
         "✅ Информация сохранена.\n\n"
         "📞 Шаг 5/5: Укажите ваш контактный телефон:\n"
         "(например: +79001234567)",
-        reply_markup=ReplyKeyboardRemove(),
+        reply_markup=_KB_REMOVE,
     )
     return CONTACT
 
 
 async def get_contact(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data["application"]["contact"] = update.message.text
-    logger.info(f"📞 Контакт: {update.message.text}")
+    logger.info("📞 Контакт: %s", update.message.text)
 
     app = context.user_data["application"]
 
-    summary = f"""
-━━━━━━━━━━━━━━━━━━━━━
-📋 ЗАЯВКА НА АВАРИЙНОГО КОМИССАРА
-━━━━━━━━━━━━━━━━━━━━━
-
-🕐 Время: {datetime.fromisoformat(app['timestamp']).strftime('%d.%m.%Y %H:%M')}
-
-📍 Место ДТП:
-{app['location']}
-
-👥 Участники:
-{app['participants']}
-
-🚗 Повреждения:
-{app['damage']}
-
-🚑 Пострадавшие:
-{app['injuries']}
-
-📞 Контакт:
-{app['contact']}
-
-━━━━━━━━━━━━━━━━━━━━━
-"""
-
-    keyboard = [
-        ["✅ Подтвердить и отправить"],
-        ["❌ Отменить"],
-    ]
-    reply_markup = ReplyKeyboardMarkup(
-        keyboard, resize_keyboard=True, one_time_keyboard=True
-    )
-
-    await update.message.reply_text(
-        summary + "\n\nПроверьте данные:", reply_markup=reply_markup
-    )
-    return CONFIRM
+    return await _send_confirm(update, app)
 
 
 # ==================== AI РЕЖИМ ====================
@@ -648,7 +812,7 @@ async def get_contact(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
 
 async def ai_chat(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_message = update.message.text
-    logger.info(f"💬 AI-чат: {user_message}")
+    logger.info("💬 AI-чат: %s", user_message)
 
     if user_message.lower() in ["/finish", "завершить", "закончить", "готово"]:
         return await finish_ai_application(update, context)
@@ -663,7 +827,7 @@ async def ai_chat(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         }
     )
 
-    ai_response = get_ai_response(
+    ai_response = await get_ai_response(
         user_message,
         context.user_data["ai_history"],
         app,
@@ -702,90 +866,54 @@ async def finish_ai_application(update: Update, context: ContextTypes.DEFAULT_TY
         )
         return AI_CHAT
 
-    summary = f"""
-━━━━━━━━━━━━━━━━━━━━━
-📋 ЗАЯВКА НА АВАРИЙНОГО КОМИССАРА
-━━━━━━━━━━━━━━━━━━━━━
+    return await _send_confirm(update, app)
 
-🕐 Время: {datetime.fromisoformat(app['timestamp']).strftime('%d.%m.%Y %H:%M')}
 
-📍 Место ДТП:
-{app.get('location', 'не указано')}
+# ==================== ПОДТВЕРЖДЕНИЕ ====================
 
-👥 Участники:
-{app.get('participants', 'не указано')}
 
-🚗 Повреждения:
-{app.get('damage', 'не указано')}
+async def _submit_application(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    app = context.user_data["application"]
+    user = update.effective_user
 
-🚑 Пострадавшие:
-{app.get('injuries', 'не указано')}
+    user_info = {
+        "first_name": user.first_name,
+        "username": user.username,
+        "user_id": user.id,
+    }
 
-📞 Контакт:
-{app.get('contact', 'не указано')}
+    formatted_application = format_application(app, user_info)
 
-━━━━━━━━━━━━━━━━━━━━━
-"""
+    await send_to_admins(context, formatted_application)
 
-    keyboard = [
-        ["✅ Подтвердить и отправить"],
-        ["❌ Отменить"],
-    ]
-    reply_markup = ReplyKeyboardMarkup(
-        keyboard, resize_keyboard=True, one_time_keyboard=True
-    )
+    logger.info("📨 НОВАЯ ЗАЯВКА ОТПРАВЛЕНА:\n%s", formatted_application)
 
     await update.message.reply_text(
-        summary + "\n\nПроверьте данные:", reply_markup=reply_markup
+        "✅ ЗАЯВКА УСПЕШНО ОТПРАВЛЕНА!\n\n"
+        "Наш специалист свяжется с вами в ближайшее время.",
+        reply_markup=_KB_REMOVE,
     )
-    return CONFIRM
-
-
-# ==================== ПОДТВЕРЖДЕНИЕ ====================
-
-
-async def confirm_application(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    choice = update.message.text
-
-    if "✅" in choice:
-        app = context.user_data["application"]
-        user = update.effective_user
 
-        user_info = {
-            "first_name": user.first_name,
-            "username": user.username,
-            "user_id": user.id,
-        }
+    return ConversationHandler.END
 
-        formatted_application = format_application(app, user_info)
 
-        await send_to_admins(context, formatted_application)
+async def _cancel_application(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text(
+        "❌ Заявка отменена. Если хотите начать заново — отправьте /start",
+        reply_markup=_KB_REMOVE,
+    )
+    return ConversationHandler.END
 
-        logger.info("=" * 50)
-        logger.info("📨 НОВАЯ ЗАЯВКА ОТПРАВЛЕНА:")
-        logger.info(f"От: {user.first_name} (@{user.username}, ID: {user.id})")
-        logger.info(f"Время: {app['timestamp']}")
-        logger.info(f"Место: {app['location']}")
-        logger.info(f"Участники: {app['participants']}")
-        logger.info(f"Повреждения: {app['damage']}")
-        logger.info(f"Пострадавшие: {app['injuries']}")
-        logger.info(f"Контакт: {app['contact']}")
-        logger.info("=" * 50)
 
-        await update.message.reply_text(
-            "✅ ЗАЯВКА УСПЕШНО ОТПРАВЛЕНА!\n\n"
-            "Наш специалист свяжется с вами в ближайшее время.",
-            reply_markup=ReplyKeyboardRemove(),
-        )
+_CONFIRM_ACTIONS = {
+    _CONFIRM_BTN: _submit_application,
+    _CANCEL_BTN: _cancel_application,
+}
 
-        return ConversationHandler.END
 
-    else:
-        await update.message.reply_text(
-            "❌ Заявка отменена. Если хотите начать заново — отправьте /start",
-            reply_markup=ReplyKeyboardRemove(),
-        )
-        return ConversationHandler.END
+async def confirm_application(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    handler = _CONFIRM_ACTIONS.get(update.message.text, _cancel_application)
+    return await handler(update, context)
 
 
 # ==================== СЛУЖЕБНОЕ ====================
@@ -794,7 +922,7 @@ async def confirm_application(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     await update.message.reply_text(
         "❌ Диалог отменён. Если хотите начать заново — отправьте /start",
-        reply_markup=ReplyKeyboardRemove(),
+        reply_markup=_KB_REMOVE,
     )
     return ConversationHandler.END
 
@@ -813,8 +941,8 @@ def main() -> None:
         logger.error("❌ TELEGRAM_TOKEN не установлен! Проверьте переменные окружения.")
         return
     
-    logger.info(f"✅ Токен бота: {'установлен' if TELEGRAM_TOKEN else 'отсутствует'}")
-    logger.info(f"✅ OpenAI: {'доступен' if openai_client else 'недоступен'}")
+    logger.info("✅ Токен бота: %s", "установлен" if TELEGRAM_TOKEN else "отсутствует")
+    logger.info("✅ OpenAI: %s", "доступен" if openai_client else "недоступен")
     
     try:
         # Используем ApplicationBuilder вместо Application.builder()
@@ -868,7 +996,7 @@ threading.Thread(target=run_health_server, daemon=True).start()
         application.run_polling()
         
     except Exception as e:
-        logger.error(f"❌ Критическая ошибка при запуске: {e}")
+        logger.error("❌ Критическая ошибка при запуске: %s", e)
         raise
 
 